@@ -0,0 +1,97 @@
+#!/bin/env python
+#
+# Copyright (c) 2026 The OML4Py contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# = oml4py-startup-benchmark.py
+#
+# == Description
+#
+# Measure the per-process cost of OML4Py instrumentation: the time to import
+# the module, and the time from constructing an OMLBase to having injected
+# the first sample, with the default and lazy construction paths. Samples
+# are sent to a local sink standing in for the OML server.
+#
+# Usage: python oml4py-startup-benchmark.py [iterations]
+#
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import oml4py
+
+def sink(server):
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=drain, args=(conn,)).start()
+
+def drain(conn):
+    while conn.recv(65536):
+        pass
+    conn.close()
+
+def import_time(iterations):
+    code = "import time; t = time.time(); import oml4py; print(time.time() - t)"
+    times = []
+    for i in range(iterations):
+        out = subprocess.check_output([sys.executable, "-c", code],
+                                      cwd=os.path.dirname(os.path.abspath(__file__)) or ".")
+        times.append(float(out))
+    return times
+
+def first_sample(iterations, uri, lazy):
+    times = []
+    for i in range(iterations):
+        # every instrumented process parses its command line once
+        oml4py.OMLBase._args = None
+        t = time.time()
+        oml = oml4py.OMLBase("bench", "bench", "n1", uri, lazy=lazy)
+        oml.addmp("mp", "value:int32")
+        oml.start()
+        oml.inject("mp", [i])
+        times.append(time.time() - t)
+        oml.close()
+    return times
+
+def report(name, times):
+    times = sorted(times)
+    sys.stdout.write("%-32s median %8.1f us   min %8.1f us\n"
+                     % (name, 1e6 * times[len(times) // 2], 1e6 * times[0]))
+
+iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server.bind(("127.0.0.1", 0))
+server.listen(128)
+sink_thread = threading.Thread(target=sink, args=(server,))
+sink_thread.daemon = True
+sink_thread.start()
+uri = "tcp:127.0.0.1:%d" % server.getsockname()[1]
+
+oml4py.OMLBase.set_log_level(oml4py.OMLBase.NONE)
+argv = sys.argv[:]
+report("import", import_time(max(1, iterations // 10)))
+report("construct to first sample", first_sample(iterations, uri, False))
+sys.argv[:] = argv
+report("construct to first sample (lazy)", first_sample(iterations, uri, True))
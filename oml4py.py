@@ -16,8 +16,7 @@
 # Date: 08/06/2012
 #
 
-import argparse
-import random
+import heapq
 import re
 import sys
 import os
@@ -26,6 +25,12 @@ from base64 import b64encode
 from time import sleep
 from time import time
 
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no monotonic clock in the standard library
+    monotonic = time
+
 __version__ = "2.10.4"
 
 # Compatibility with Python 2 and 3's string type
@@ -37,6 +42,18 @@ else:
         return bytes(s, "UTF-8")
 
 
+# Change filter state for an MP, see OMLBase.set_change_filter()
+class _ChangeFilter(object):
+
+    def __init__(self, limits, keyframe):
+        self.limits = limits      # threshold for each field, or None
+        self.keyframe = keyframe  # max consecutive suppressed tuples, 0 for no limit
+        self.last = None          # marshalled fields of the last tuple sent
+        self.run = 0              # consecutive suppressed tuples
+        self.total = 0            # suppressed tuples since the filter was set
+        self.reported = 0         # total as last reported in metadata
+
+
 class OMLBase:
 
     """
@@ -73,27 +90,46 @@ class OMLBase:
 
     # Initializer 
     #
-    def __init__(self, appname, domain=None, sender=None, uri=None, expid=None):
+    # With lazy=True, the command line is neither parsed nor rewritten, so
+    # the connection details come from the parameters or the environment
+    # only, no banner is printed, and start() defers connecting to the
+    # server until the first tuple or metadata is sent. This keeps the
+    # cost of instrumenting short-lived processes to a minimum.
+    #
+    def __init__(self, appname, domain=None, sender=None, uri=None, expid=None, lazy=False):
 
-        OMLBase._info("%s [Protocol V%d] %s" % (OMLBase.VERSION_STRING, OMLBase.PROTOCOL, OMLBase.COPYRIGHT))
+        if not lazy:
+            OMLBase._info("%s [Protocol V%d] %s" % (OMLBase.VERSION_STRING, OMLBase.PROTOCOL, OMLBase.COPYRIGHT))
 
         # process the command line
-        if OMLBase._args is None:
+        if OMLBase._args is None and not lazy:
+            import argparse
             parser = argparse.ArgumentParser(prog=appname)
             parser.add_argument("--oml-id", default=None, help="node identifier")
             parser.add_argument("--oml-domain", default=None, help="experimental domain")
             parser.add_argument("--oml-collect", default="localhost", help="URI for a remote collection point")
             OMLBase._args, sys.argv[1:] = parser.parse_known_args()
 
-        # setup instance variables
+        # setup instance variables; threading is only imported here, so that
+        # importing this module stays cheap, but the lock must exist before
+        # any poller thread can be started
+        import threading
         self._state = OMLBase.DISCONNECTED
         self._sock = None
         self._starttime = None
         self._streams = 0
         self._schemas = {}
         self._schema_str = ""
-        self._urandom = random.SystemRandom()
+        self._urandom = None
+        self._lazy = lazy
         self._has_valid_connection_attrs = True
+        self._lock = threading.RLock()
+        self._pollers = {}
+        self._filters = {}
+        self._poll_heap = []
+        self._poll_cond = threading.Condition()
+        self._poll_thread = None
+        self._polling = False
 
         # set the connection details
         self._appname = appname
@@ -104,10 +140,10 @@ class OMLBase:
         if expid:
             OMLBase._warning("%s parameter 'expid' is deprecated; please use 'domain' instead" % self.__class__.__name__)
 
-        self._oml_domain = OMLBase._init_from(domain or expid, "oml_domain", "OML_DOMAIN", "OML_EXP_ID", "UNKNOWN")
-        self._oml_id = OMLBase._init_from(sender, "oml_id", "OML_ID", "OML_NAME", "UNKNOWN")
+        self._oml_domain = OMLBase._init_from(domain or expid, "oml_domain", "OML_DOMAIN", "OML_EXP_ID", "UNKNOWN", not lazy)
+        self._oml_id = OMLBase._init_from(sender, "oml_id", "OML_ID", "OML_NAME", "UNKNOWN", not lazy)
         default_uri =  "tcp:%s:%d" %(OMLBase.DEFAULT_HOST, OMLBase.DEFAULT_PORT)
-        uri = OMLBase._init_from(uri, "oml_collect", "OML_COLLECT", "OML_SERVER", default_uri)
+        uri = OMLBase._init_from(uri, "oml_collect", "OML_COLLECT", "OML_SERVER", default_uri, not lazy)
 
         # parse URI
         uri_l = uri.split(":")
@@ -151,11 +187,18 @@ class OMLBase:
     def start(self):
         if self._state == OMLBase.DISCONNECTED or self._state == OMLBase.DISABLED:
             self._starttime = int(time())
-            if self._has_valid_connection_attrs and self._connect():
+            for f in self._filters.values():
+                f.last = None
+                f.run = 0
+            if self._has_valid_connection_attrs and self._lazy:
+                # connect on first use, see _lazy_connect()
+                self._state = OMLBase.CONNECTED
+            elif self._has_valid_connection_attrs and self._connect():
                 self._state = OMLBase.CONNECTED
             else:
                 self._state = OMLBase.DISABLED
                 OMLBase._warning("Disabling OML output")
+            self._start_polling()
         else:
             return OMLBase._error("start() called unexpectedly (state=%s)!" % (self._state))
         return True
@@ -164,8 +207,12 @@ class OMLBase:
     # Close the connection to the OML server
     #
     def close(self):
+        if self._state == OMLBase.CONNECTED or self._state == OMLBase.DISABLED:
+            self._stop_polling()
+            self._report_suppressed()
         if self._state == OMLBase.CONNECTED:
-            self._disconnect()
+            if self._sock is not None:
+                self._disconnect()
             self._starttime = None
             self._state = OMLBase.DISCONNECTED
         elif self._state == OMLBase.DISABLED:
@@ -179,6 +226,9 @@ class OMLBase:
     # Generate a new GUID
     #
     def generate_guid(self):
+        if self._urandom is None:
+            import random
+            self._urandom = random.SystemRandom()
         guid = self._urandom.getrandbits(64)
         while 0 == guid:
             guid = self._urandom.getrandbits(64)
@@ -196,12 +246,16 @@ class OMLBase:
         elif not self._is_valid_schema_str(schema_str.strip()):
             return OMLBase._error("Invalid MP schema: %s" % schema_str.strip())
         # process new MP
-        if self._state == OMLBase.CONNECTED:
-            return self._add_schema(mpname, schema_str) and self._inject_schema(mpname)
-        if self._state == OMLBase.DISABLED:
-            return self._add_schema(mpname, schema_str) and self._write_schema(mpname)
-        else:
-            return self._add_schema(mpname, schema_str)
+        with self._lock:
+            if self._state == OMLBase.CONNECTED and self._sock is not None:
+                return self._add_schema(mpname, schema_str) and self._inject_schema(mpname)
+            if self._state == OMLBase.CONNECTED:
+                # not connected yet, the schema will be sent in the header
+                return self._add_schema(mpname, schema_str)
+            if self._state == OMLBase.DISABLED:
+                return self._add_schema(mpname, schema_str) and self._write_schema(mpname)
+            else:
+                return self._add_schema(mpname, schema_str)
 
 
     # Inject a new measurement tuple
@@ -215,12 +269,14 @@ class OMLBase:
         elif values is None:
             return OMLBase._error("No measurement tuple")
         # process injection request
-        if self._state == OMLBase.CONNECTED:
-            return self._inject_measurement(mpname, values)
-        elif self._state == OMLBase.DISABLED:
-            return self._write_measurement(mpname, values);
-        else:
-            return OMLBase._error("inject() called when in %s state" % self._state)
+        with self._lock:
+            self._lazy_connect()
+            if self._state == OMLBase.CONNECTED:
+                return self._inject_measurement(mpname, values)
+            elif self._state == OMLBase.DISABLED:
+                return self._write_measurement(mpname, values);
+            else:
+                return OMLBase._error("inject() called when in %s state" % self._state)
 
 
     # Inject metadata
@@ -236,12 +292,118 @@ class OMLBase:
         elif not OMLBase._is_valid_name(key):
             return OMLBase._error("'%s' is not a valid metadata key name\n" % key)
         # process injection request
-        if self._state == OMLBase.CONNECTED:
-            return self._inject_metadata(mpname, key, value, fname)
-        elif self._state == OMLBase.DISABLED:
-            return self._write_metadata(mpname, key, value, fname);
-        else:
-            return OMLBase._error("Did not call start")
+        with self._lock:
+            self._lazy_connect()
+            if self._state == OMLBase.CONNECTED:
+                return self._inject_metadata(mpname, key, value, fname)
+            elif self._state == OMLBase.DISABLED:
+                return self._write_metadata(mpname, key, value, fname);
+            else:
+                return OMLBase._error("Did not call start")
+
+
+    # Only emit tuples into an MP when they change
+    #
+    # A tuple which marshals identically to the last one sent on mpname is
+    # not sent. Fields listed in thresholds (a dict of field name to
+    # absolute value) are also considered unchanged while they differ from
+    # the last value sent by less than the threshold. A suppressed tuple still consumes a
+    # sequence number, so gaps in seq_no show where tuples were elided.
+    # After keyframe consecutive suppressed tuples, the next one is sent
+    # regardless so consumers can reconstruct the series, preceded by the
+    # total number of suppressed tuples as "suppressed" metadata on the MP.
+    # A keyframe of 0 disables keyframes.
+    #
+    def set_change_filter(self, mpname, thresholds=None, keyframe=100):
+        # check params
+        if mpname is None or not OMLBase._is_valid_name(mpname):
+            return OMLBase._error("Invalid measurement point name '%s'" % mpname)
+        elif mpname not in self._schemas:
+            return OMLBase._error("Tried to filter unknown MP '%s'" % mpname)
+        _, names, schema, _, _ = self._schemas[mpname]
+        types = dict((name.lower(), type.lower()) for name, type in schema)
+        limits = {}
+        for fname, limit in (thresholds or {}).items():
+            fname = fname.lower()
+            if fname not in names:
+                return OMLBase._error("Field '%s' not found in MP '%s'" % (fname, mpname))
+            elif types[fname] not in ("int32", "uint32", "int64", "uint64", "double"):
+                return OMLBase._error("Cannot set a threshold on %s:%s" % (fname, types[fname]))
+            try:
+                limits[fname] = abs(float(limit))
+            except (TypeError, ValueError):
+                return OMLBase._error("Invalid threshold '%s' for %s" % (limit, fname))
+        try:
+            keyframe = int(keyframe or 0)
+        except (TypeError, ValueError):
+            return OMLBase._error("Invalid keyframe interval '%s'" % keyframe)
+        if keyframe < 0:
+            return OMLBase._error("Invalid keyframe interval '%d'" % keyframe)
+        limits = [limits.get(name.lower()) for name, _ in schema]
+        with self._lock:
+            self._filters[mpname] = _ChangeFilter(limits, keyframe)
+        return True
+
+
+    # Remove the change filter from an MP
+    #
+    def del_change_filter(self, mpname):
+        with self._lock:
+            if mpname not in self._filters:
+                return OMLBase._error("No change filter set for MP '%s'" % mpname)
+            del self._filters[mpname]
+        return True
+
+
+    # Register a function to be polled periodically
+    #
+    # Every interval seconds, func() is called without arguments and the
+    # tuple it returns is injected into mpname; returning None skips the
+    # sample. All pollers are serviced by a single scheduler thread, which
+    # keeps deadlines on a fixed grid rather than sleeping for interval
+    # after each call, so they do not drift. The grid starts at start(), or
+    # at registration if polling is already running.
+    # Samples due on the same tick are sent in a single write. Deadlines
+    # which could not be met are skipped, and the running count is
+    # reported as "missed_deadlines" metadata on the MP.
+    #
+    def addpoll(self, mpname, func, interval):
+        # check params
+        if mpname is None or not OMLBase._is_valid_name(mpname):
+            return OMLBase._error("Invalid measurement point name '%s'" % mpname)
+        elif mpname not in self._schemas:
+            return OMLBase._error("Tried to poll into unknown MP '%s'" % mpname)
+        elif mpname in self._pollers:
+            return OMLBase._error("Attempted to add an existing poller for MP '%s'" % mpname)
+        elif not callable(func):
+            return OMLBase._error("Poller for MP '%s' is not callable" % mpname)
+        try:
+            interval = float(interval)
+        except (TypeError, ValueError):
+            return OMLBase._error("Invalid polling interval '%s'" % interval)
+        if not interval > 0:
+            return OMLBase._error("Invalid polling interval '%s'" % interval)
+        # register the poller, and schedule it if we are already running
+        with self._poll_cond:
+            self._pollers[mpname] = [func, interval, 0]
+            if self._polling:
+                heapq.heappush(self._poll_heap, (monotonic() + interval, mpname))
+                self._poll_cond.notify()
+        if self._state == OMLBase.CONNECTED or self._state == OMLBase.DISABLED:
+            self._start_polling()
+        return True
+
+
+    # Unregister a periodic poller
+    #
+    def delpoll(self, mpname):
+        with self._poll_cond:
+            if mpname not in self._pollers:
+                return OMLBase._error("No poller registered for MP '%s'" % mpname)
+            del self._pollers[mpname]
+            self._poll_heap = [e for e in self._poll_heap if e[1] != mpname]
+            heapq.heapify(self._poll_heap)
+        return True
 
 
     # state machine actions
@@ -272,6 +434,22 @@ class OMLBase:
         except Exception as ex:
             return OMLBase._error("Unexpected " + str(ex))
 
+    # Connect to the OML server if start() deferred it, disabling OML
+    # output if that fails
+    #
+    def _lazy_connect(self):
+        if self._state != OMLBase.CONNECTED or self._sock is not None:
+            return
+        if not self._connect():
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                except socket.error:
+                    pass
+                self._sock = None
+            self._state = OMLBase.DISABLED
+            OMLBase._warning("Disabling OML output")
+
     # Disconnect from the OML server
     #
     def _disconnect(self):
@@ -286,6 +464,142 @@ class OMLBase:
             return OMLBase._error("Unexpected " + str(ex))
 
 
+    # Start the scheduler thread, if there is anything to poll
+    #
+    def _start_polling(self):
+        import threading
+        with self._poll_cond:
+            if self._polling or not self._pollers:
+                return
+            now = monotonic()
+            self._poll_heap = [(now + p[1], mpname) for mpname, p in self._pollers.items()]
+            heapq.heapify(self._poll_heap)
+            self._polling = True
+            self._poll_thread = threading.Thread(target=self._poll_loop, name="oml4py-poller")
+            self._poll_thread.daemon = True
+            self._poll_thread.start()
+
+    # Stop the scheduler thread and wait for the current tick to complete
+    #
+    def _stop_polling(self):
+        import threading
+        with self._poll_cond:
+            if not self._polling:
+                return
+            self._polling = False
+            self._poll_cond.notify()
+            thread = self._poll_thread
+            self._poll_thread = None
+        if thread is not threading.current_thread():
+            thread.join()
+
+    # Scheduler thread main loop
+    #
+    def _poll_loop(self):
+        while True:
+            # wait for the next deadline, and collect all pollers due by then
+            with self._poll_cond:
+                while self._polling:
+                    if not self._poll_heap:
+                        self._poll_cond.wait()
+                        continue
+                    delay = self._poll_heap[0][0] - monotonic()
+                    if delay <= 0:
+                        break
+                    self._poll_cond.wait(delay)
+                if not self._polling:
+                    return
+                now = monotonic()
+                due = []
+                while self._poll_heap and self._poll_heap[0][0] <= now:
+                    deadline, mpname = heapq.heappop(self._poll_heap)
+                    poller = self._pollers[mpname]
+                    func, interval, missed = poller
+                    # skip over any deadline we are already too late for
+                    late = int((now - deadline) / interval)
+                    if late:
+                        poller[2] = missed + late
+                    heapq.heappush(self._poll_heap, (deadline + (late + 1) * interval, mpname))
+                    due.append((mpname, func, late and poller[2]))
+            try:
+                self._poll_tick(due)
+            except Exception as ex:
+                OMLBase._error("Unexpected error while polling: %s" % str(ex))
+
+    # Sample all due pollers and send their tuples in a single write
+    #
+    def _poll_tick(self, due):
+        samples = []
+        for mpname, func, missed in due:
+            try:
+                samples.append((mpname, func(), missed))
+            except Exception as ex:
+                OMLBase._error("Poller for MP '%s' failed: %s" % (mpname, str(ex)))
+        with self._lock:
+            inject_str = ""
+            for mpname, values, missed in samples:
+                if mpname not in self._schemas:
+                    continue
+                if missed:
+                    inject_str += self._marshal_metadata(mpname, "missed_deadlines", str(missed), None) or ""
+                if values is not None:
+                    inject_str += self._marshal_measurement(mpname, values) or ""
+            if not inject_str:
+                return
+            self._lazy_connect()
+            if self._state == OMLBase.CONNECTED:
+                try:
+                    self._sock.sendall(to_bytes(inject_str))
+                except:
+                    OMLBase._error("Could not send polled samples\n%s" % inject_str)
+            elif self._state == OMLBase.DISABLED:
+                sys.stdout.write(inject_str)
+
+
+    # Decide whether a tuple passes the change filter on its MP
+    #
+    # Takes the marshalled tuple, so values are compared as they would be
+    # sent, and records it as sent or suppressed. Returns a (send, report)
+    # pair, where report is the total number of suppressed tuples to report
+    # as metadata before this one, if any; the caller marks it as reported.
+    #
+    def _filter_measurement(self, mpname, inject_str):
+        f = self._filters.get(mpname)
+        if f is None:
+            return (True, 0)
+        # skip the timestamp, stream and sequence number
+        fields = inject_str.rstrip('\n').split('\t')[3:]
+        keyframe = f.keyframe and f.run >= f.keyframe
+        if f.last is None or keyframe:
+            changed = True
+        else:
+            changed = False
+            for limit, new, old in zip(f.limits, fields, f.last):
+                if new == old:
+                    continue
+                elif limit is None or abs(float(new) - float(old)) >= limit:
+                    changed = True
+                    break
+        if not changed:
+            f.run += 1
+            f.total += 1
+            return (False, 0)
+        f.last = fields
+        f.run = 0
+        if keyframe and f.total != f.reported:
+            return (True, f.total)
+        return (True, 0)
+
+    # Report suppression counts not yet sent as metadata
+    #
+    def _report_suppressed(self):
+        with self._lock:
+            for mpname, f in self._filters.items():
+                if f.total != f.reported:
+                    f.reported = f.total
+                    self.inject_metadata(mpname, "suppressed", str(f.total))
+
+
     # Process MP schema
     #
     def _add_schema(self, mpname, schema_str):
@@ -344,7 +658,10 @@ class OMLBase:
     #
     def _inject_measurement(self, mpname, values):
         inject_str = self._marshal_measurement(mpname, values)
-        if inject_str:
+        if inject_str == "":
+            # suppressed by the change filter
+            return True
+        elif inject_str:
             try:
                 self._sock.send(to_bytes(inject_str))
                 return True
@@ -358,7 +675,9 @@ class OMLBase:
     #
     def _write_measurement(self, mpname, values):
         inject_str = self._marshal_measurement(mpname, values)
-        if inject_str:
+        if inject_str == "":
+            return True
+        elif inject_str:
             sys.stdout.write(inject_str)
             return True
         else:
@@ -367,11 +686,25 @@ class OMLBase:
 
     # Marshal a measurement tuple
     #
+    # Returns an empty string if the tuple was suppressed by the change
+    # filter, in which case it still consumes a sequence number.
+    #
     def _marshal_measurement(self, mpname, values):
         timestamp = time() - self._starttime
         stream, names, schema, schema_str, seqno = self._schemas[mpname]
         self._schemas[mpname] = (stream, names, schema, schema_str, seqno+1)
-        return self._marshal(timestamp, stream, seqno, schema, values)
+        inject_str = self._marshal(timestamp, stream, seqno, schema, values)
+        if inject_str is None:
+            return None
+        send, report = self._filter_measurement(mpname, inject_str)
+        if not send:
+            return ""
+        if report:
+            metadata_str = self._marshal_metadata(mpname, "suppressed", str(report), None)
+            if metadata_str:
+                self._filters[mpname].reported = report
+                inject_str = metadata_str + inject_str
+        return inject_str
 
 
     # Marshal and inject a metadata tuple
@@ -535,10 +868,10 @@ class OMLBase:
     # Initialization helper function
     #
     @staticmethod
-    def _init_from(param, arg, env, depr = None, default = None):
+    def _init_from(param, arg, env, depr = None, default = None, use_args = True):
         if param:
             return param
-        elif arg in OMLBase._args.__dict__:
+        elif use_args and OMLBase._args is not None and arg in OMLBase._args.__dict__:
             return OMLBase._args.__dict__[arg]
         elif env in os.environ.keys():
             return os.environ[env]
@@ -630,8 +963,202 @@ def _selftest():
     b.inject("example2", [0])
     b.inject("example2", [4294967295])
 
+    b.addmp("example4", "v:int32 s:string t:double")
+    r = b.set_change_filter("example4", {"t": 0.5}, keyframe=3)
+    assert r
+    f = b._filters["example4"]
+    r = b.inject("example4", [1, "up", 20.0])
+    assert r and f.total == 0
+    # repeated tuples, also as different values which marshal the same,
+    # and changes below the threshold, are suppressed
+    r = b.inject("example4", ["1", "up", 20.0])
+    assert r and f.total == 1
+    r = b.inject("example4", [1, "up", 20.4])
+    assert r and f.total == 2
+    # invalid tuples are rejected, not suppressed
+    r = b.inject("example4", ["abc", "up", 20.0])
+    assert not r
+    r = b.inject("example4", ["abc", "up", 20.0])
+    assert not r and f.total == 2
+    # change above the threshold is sent
+    r = b.inject("example4", [1, "up", 20.6])
+    assert r and f.total == 2 and f.run == 0
+    # keyframe after 3 suppressed tuples, preceded by "suppressed" 5
+    for i in range(4):
+        r = b.inject("example4", [1, "up", 20.6])
+        assert r
+    assert f.run == 0 and f.total == f.reported == 5
+
+    # a threshold of 0 still suppresses identical values
+    b.addmp("example5", "x:double")
+    r = b.set_change_filter("example5", {"x": 0})
+    assert r
+    f = b._filters["example5"]
+    for i in range(3):
+        b.inject("example5", [1.0])
+    assert f.total == 2
+
     b.close()
 
+    _selftest_polling()
+    _selftest_lazy()
+
+
+# Collects what is written to stdout in DISABLED mode
+class _Recorder(object):
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, s):
+        self.writes.append(s)
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        return [l.split('\t') for l in "".join(self.writes).splitlines()]
+
+
+def _selftest_polling():
+    stdout = sys.stdout
+    recorder = _Recorder()
+    sys.stdout = recorder
+    try:
+        # an unreachable server, so that tuples are written to stdout
+        p = OMLBase("polling", uri="tcp:127.0.0.1:1")
+        p.addmp("fast", "n:int32")
+        p.addmp("pair", "n:int32")
+        p.addmp("none", "n:int32")
+        p.addmp("fail", "n:int32")
+        n = [0]
+        def fast():
+            n[0] += 1
+            return [n[0]]
+        def fail():
+            raise ValueError("deliberate failure")
+        for mpname, func in (("fast", fast), ("pair", lambda: [0]),
+                             ("none", lambda: None), ("fail", fail)):
+            r = p.addpoll(mpname, func, 0.05)
+            assert r
+        p.start()
+        sleep(0.52)
+        r = p.delpoll("pair")
+        assert r
+        sleep(0.2)
+        thread = p._poll_thread
+        p.close()
+        # close() stops the scheduler thread
+        assert p._poll_thread is None and not thread.is_alive()
+
+        lines = recorder.lines()
+        fast_lines = [l for l in lines if l[1] == "1"]
+        pair_lines = [l for l in lines if l[1] == "2"]
+        # every tick samples fast, on a fixed grid without drift
+        assert len(fast_lines) >= 10
+        assert [int(l[2]) for l in fast_lines] == list(range(len(fast_lines)))
+        t0 = float(fast_lines[0][0])
+        for i, l in enumerate(fast_lines):
+            assert abs(float(l[0]) - t0 - 0.05 * i) < 0.04
+        # pollers due together are written together
+        for w in recorder.writes:
+            if "\t2\t" in w:
+                assert "\t1\t" in w
+        # pair stopped after delpoll, none and fail produced nothing
+        assert 0 < len(pair_lines) < len(fast_lines) - 2
+        assert not [l for l in lines if l[1] in ("3", "4")]
+
+        # a slow poller misses deadlines, which are reported as metadata
+        recorder.writes = []
+        q = OMLBase("slowpoll", uri="tcp:127.0.0.1:1")
+        q.addmp("slow", "n:int32")
+        calls = [0]
+        def slow():
+            calls[0] += 1
+            if calls[0] == 2:
+                sleep(0.17)
+            return [calls[0]]
+        r = q.addpoll("slow", slow, 0.05)
+        assert r
+        q.start()
+        sleep(0.5)
+        q.close()
+        lines = recorder.lines()
+        slow_lines = [l for l in lines if l[1] == "1"]
+        missed = [l for l in lines if l[1] == "0" and l[4] == "missed_deadlines"]
+        assert [int(l[2]) for l in slow_lines] == list(range(len(slow_lines)))
+        assert len(missed) == 1 and missed[0][3] == ".slowpoll_slow"
+        assert int(missed[0][5]) >= 2
+    finally:
+        sys.stdout = stdout
+
+
+def _selftest_lazy():
+    import threading
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    server.settimeout(5)
+    received = []
+    def sink():
+        conn, _ = server.accept()
+        data = b""
+        while True:
+            d = conn.recv(4096)
+            if not d:
+                break
+            data += d
+        conn.close()
+        received.append(data.decode("UTF-8"))
+    thread = threading.Thread(target=sink)
+    thread.start()
+
+    # lazy instances ignore the command line, even if it was parsed before
+    assert OMLBase._args is not None
+    uri = "tcp:127.0.0.1:%d" % server.getsockname()[1]
+    environ = os.environ.get("OML_COLLECT")
+    os.environ["OML_COLLECT"] = uri
+    try:
+        l = OMLBase("lazy", "dom", "id", lazy=True)
+    finally:
+        if environ is None:
+            del os.environ["OML_COLLECT"]
+        else:
+            os.environ["OML_COLLECT"] = environ
+    assert (l._omlserver, l._omlport) == ("127.0.0.1", server.getsockname()[1])
+
+    # nothing is sent until the first injection, so MPs added after start()
+    # still go in the header
+    l.addmp("before", "n:int32")
+    l.start()
+    assert l._sock is None
+    l.addmp("after", "n:int32")
+    assert l._sock is None
+    r = l.inject("after", [42])
+    assert r and l._sock is not None
+    l.close()
+    thread.join()
+    server.close()
+    header, _, body = received[0].partition("\n\n")
+    assert "schema: 1 lazy_before n:int32" in header
+    assert "schema: 2 lazy_after n:int32" in header
+    assert body.split("\t")[1:] == ["2", "0", "42\n"]
+
+    # if the server cannot be reached, tuples are written to stdout
+    stdout = sys.stdout
+    recorder = _Recorder()
+    sys.stdout = recorder
+    try:
+        l = OMLBase("lazy", "dom", "id", "tcp:127.0.0.1:1", lazy=True)
+        l.addmp("mp", "n:int32")
+        l.start()
+        r = l.inject("mp", [7])
+        l.close()
+    finally:
+        sys.stdout = stdout
+    assert r and l._sock is None
+    assert [line[1:] for line in recorder.lines()] == [["1", "0", "7"]]
+
 
 if __name__ == '__main__':
     _selftest()